@@ -0,0 +1,131 @@
+import asyncio
+import heapq
+import itertools
+import math
+from collections import OrderedDict
+
+
+class PeticionRechazada(Exception):
+    """La petición no puede admitirse: cola llena o espera excedida"""
+
+    def __init__(self, motivo: str, retry_after: int):
+        super().__init__(motivo)
+        self.motivo = motivo
+        self.retry_after = retry_after
+
+
+class ControlAdmision:
+    """
+    Limita las peticiones en curso y encola el resto con prioridad.
+    Menor valor de prioridad = se atiende antes. Si la cola está llena o la
+    espera supera `espera_maxima` segundos, se rechaza en lugar de encolar.
+    """
+
+    def __init__(self, max_concurrencia: int, max_cola: int, espera_maxima: float):
+        self.max_concurrencia = max_concurrencia
+        self.max_cola = max_cola
+        self.espera_maxima = espera_maxima
+        self._activas = 0
+        self._cola = []  # heap de (prioridad, orden_llegada, future)
+        self._orden = itertools.count()
+        self.admitidas = 0
+        self.rechazadas = 0
+
+    def _rechazar(self, motivo: str):
+        self.rechazadas += 1
+        return PeticionRechazada(motivo, max(1, math.ceil(self.espera_maxima)))
+
+    async def adquirir(self, prioridad: int):
+        """Espera un hueco de ejecución o lanza PeticionRechazada"""
+        if self._activas < self.max_concurrencia and not self._cola:
+            self._activas += 1
+            self.admitidas += 1
+            return
+
+        if len(self._cola) >= self.max_cola:
+            # Cola llena: solo entra si desplaza a una petición menos prioritaria
+            peor = max(self._cola) if self._cola else None
+            if peor is None or peor[0] <= prioridad:
+                raise self._rechazar("cola llena")
+            self._cola.remove(peor)
+            heapq.heapify(self._cola)
+            peor[2].set_exception(self._rechazar("desplazada por mayor prioridad"))
+
+        futuro = asyncio.get_running_loop().create_future()
+        entrada = (prioridad, next(self._orden), futuro)
+        heapq.heappush(self._cola, entrada)
+
+        try:
+            await asyncio.wait({futuro}, timeout=self.espera_maxima)
+        except asyncio.CancelledError:
+            # El cliente se fue mientras esperaba: no dejar huecos perdidos
+            if futuro.done():
+                if not futuro.cancelled() and futuro.exception() is None:
+                    self.liberar()
+            else:
+                self._cola.remove(entrada)
+                heapq.heapify(self._cola)
+                futuro.cancel()
+            raise
+
+        if futuro.done():
+            # Hueco cedido por liberar() o excepción de desplazamiento
+            futuro.result()
+            self.admitidas += 1
+            return
+
+        self._cola.remove(entrada)
+        heapq.heapify(self._cola)
+        futuro.cancel()
+        raise self._rechazar("espera máxima excedida")
+
+    def liberar(self):
+        """Cede el hueco a la petición en cola más prioritaria"""
+        while self._cola:
+            _, _, futuro = heapq.heappop(self._cola)
+            if not futuro.done():
+                futuro.set_result(True)
+                return
+        self._activas -= 1
+
+    def estadisticas(self):
+        return {
+            "en_curso": self._activas,
+            "en_cola": len(self._cola),
+            "max_concurrencia": self.max_concurrencia,
+            "max_cola": self.max_cola,
+            "espera_maxima_s": self.espera_maxima,
+            "admitidas": self.admitidas,
+            "rechazadas": self.rechazadas
+        }
+
+
+class CacheRespuestas:
+    """Cache LRU de respuestas ya calculadas, usada en modo degradado"""
+
+    def __init__(self, max_entradas: int, max_bytes: int):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self.tamano_bytes = 0
+        self._datos = OrderedDict()
+
+    def obtener(self, clave: str):
+        if clave not in self._datos:
+            return None
+        self._datos.move_to_end(clave)
+        return self._datos[clave]
+
+    def guardar(self, clave: str, valor: bytes):
+        if len(valor) > self.max_bytes:
+            return
+        if clave in self._datos:
+            self.tamano_bytes -= len(self._datos[clave])
+        self._datos[clave] = valor
+        self._datos.move_to_end(clave)
+        self.tamano_bytes += len(valor)
+        while len(self._datos) > self.max_entradas or self.tamano_bytes > self.max_bytes:
+            _, expulsado = self._datos.popitem(last=False)
+            self.tamano_bytes -= len(expulsado)
+
+    def __len__(self):
+        return len(self._datos)
@@ -0,0 +1,155 @@
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from admision import CacheRespuestas
+
+MAX_BYTES_CACHE = 32 * 1024 * 1024
+
+
+class ConsorcioNoEncontrado(Exception):
+    """No hay datos para el consorcio solicitado"""
+
+
+class Consorcio:
+    """Datos de paradas, modelo y caches de un consorcio"""
+
+    def __init__(self, id_consorcio: int, datos_ctan: dict, model, tamano_base: int,
+                 max_bytes_cache: int = MAX_BYTES_CACHE):
+        self.id = id_consorcio
+        self.datos_ctan = datos_ctan
+        self.model = model
+        self.tamano_base = tamano_base
+        self.red_carga = None
+        self.cubo_demanda = None
+        self.cache_respuestas = CacheRespuestas(max_entradas=2048, max_bytes=max_bytes_cache)
+
+    def memoria_bytes(self):
+        """Datos y modelo (estimados por los pickles) más caches y estructuras derivadas"""
+        total = self.tamano_base + self.cache_respuestas.tamano_bytes
+        if self.red_carga is not None:
+            total += self.red_carga["tamano_bytes"]
+        if self.cubo_demanda is not None:
+            total += self.cubo_demanda.nbytes
+        return total
+
+
+def cargar_consorcio(id_consorcio: int, ruta_datos: str, ruta_modelo: str,
+                     max_bytes_cache: int = MAX_BYTES_CACHE):
+    """Carga un consorcio desde disco; el tamaño en memoria se estima por los pickles"""
+    if not os.path.exists(ruta_datos) or not os.path.exists(ruta_modelo):
+        raise ConsorcioNoEncontrado(f"Consorcio {id_consorcio} no disponible")
+
+    with open(ruta_modelo, "rb") as f:
+        model = pickle.load(f)
+
+    with open(ruta_datos, "rb") as f:
+        datos_ctan = pickle.load(f)
+
+    tamano = os.path.getsize(ruta_datos) + os.path.getsize(ruta_modelo)
+    return Consorcio(id_consorcio, datos_ctan, model, tamano, max_bytes_cache)
+
+
+class AlmacenConsorcios:
+    """
+    Consorcios cargados bajo demanda y retenidos en una LRU con presupuesto de
+    memoria. Las cargas concurrentes del mismo consorcio comparten una sola
+    lectura de disco. Los consorcios `fijos` nunca se expulsan.
+    """
+
+    def __init__(self, cargar, memoria_maxima: int, fijos=()):
+        self._cargar = cargar
+        self.memoria_maxima = memoria_maxima
+        self.fijos = set(fijos)
+        self._lock = threading.Lock()
+        self._cargados = OrderedDict()
+        self._en_carga = {}
+        self._contadores = {}
+
+    def _contador(self, id_consorcio: int):
+        return self._contadores.setdefault(
+            id_consorcio, {"aciertos": 0, "fallos": 0, "cargas": 0, "expulsiones": 0}
+        )
+
+    def obtener(self, id_consorcio: int):
+        with self._lock:
+            contador = self._contador(id_consorcio)
+            if id_consorcio in self._cargados:
+                self._cargados.move_to_end(id_consorcio)
+                contador["aciertos"] += 1
+                return self._cargados[id_consorcio]
+
+            contador["fallos"] += 1
+            futuro = self._en_carga.get(id_consorcio)
+            propietario = futuro is None
+            if propietario:
+                futuro = Future()
+                self._en_carga[id_consorcio] = futuro
+
+        if not propietario:
+            return futuro.result()
+
+        try:
+            consorcio = self._cargar(id_consorcio)
+        except Exception as e:
+            with self._lock:
+                del self._en_carga[id_consorcio]
+                # No guardar contadores de consorcios que nunca llegaron a cargarse
+                if contador["cargas"] == 0:
+                    self._contadores.pop(id_consorcio, None)
+            futuro.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._en_carga[id_consorcio]
+            self._cargados[id_consorcio] = consorcio
+            contador["cargas"] += 1
+            self._expulsar(conservar=id_consorcio)
+        futuro.set_result(consorcio)
+        return consorcio
+
+    def ajustar_memoria(self):
+        """Reaplica el presupuesto tras crecer las caches de algún consorcio"""
+        with self._lock:
+            self._expulsar(conservar=None)
+
+    def _expulsar(self, conservar):
+        """Expulsa los menos usados hasta entrar en el presupuesto de memoria"""
+        for id_consorcio in list(self._cargados):
+            if self.memoria_usada() <= self.memoria_maxima:
+                return
+            if id_consorcio == conservar or id_consorcio in self.fijos:
+                continue
+            del self._cargados[id_consorcio]
+            self._contadores[id_consorcio]["expulsiones"] += 1
+
+    def memoria_usada(self):
+        return sum(c.memoria_bytes() for c in self._cargados.values())
+
+    def cargado(self, id_consorcio: int):
+        """Devuelve el consorcio si ya está en memoria, sin provocar su carga"""
+        with self._lock:
+            return self._cargados.get(id_consorcio)
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "memoria_usada_bytes": self.memoria_usada(),
+                "memoria_maxima_bytes": self.memoria_maxima,
+                "consorcios": [
+                    {
+                        "id_consorcio": id_consorcio,
+                        "cargado": id_consorcio in self._cargados,
+                        "memoria_bytes": self._cargados[id_consorcio].memoria_bytes()
+                        if id_consorcio in self._cargados else 0,
+                        "cache_bytes": self._cargados[id_consorcio].cache_respuestas.tamano_bytes
+                        if id_consorcio in self._cargados else 0,
+                        "entradas_cache": len(self._cargados[id_consorcio].cache_respuestas)
+                        if id_consorcio in self._cargados else 0,
+                        **contador
+                    }
+                    for id_consorcio, contador in self._contadores.items()
+                ]
+            }
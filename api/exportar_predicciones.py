@@ -0,0 +1,198 @@
+"""
+Exporta predicciones por parada y hora para todas las líneas y un rango de
+fechas, repartiendo las particiones (línea x fecha) en un pool de procesos.
+
+Uso:
+    python exportar_predicciones.py --desde 2026-01-01 --hasta 2026-01-31 --salida export/
+    python exportar_predicciones.py --consorcio 2 --desde 2026-01-01 --hasta 2026-01-31 \\
+        --salida export/ --formato csv --procesos 8
+
+Cada partición se escribe en salida/AAAA-MM-DD/CODIGO.parquet (o .csv) e
+incluye las columnas fecha y linea, así que el directorio se puede leer entero.
+Si se interrumpe, al relanzar se saltan las particiones ya escritas; el
+escenario (consorcio y condiciones) se guarda en salida/escenario.json y un
+relanzamiento con otro escenario sobre la misma salida se rechaza.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import pickle
+import time
+from datetime import datetime, timedelta
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+
+from consorcios import cargar_consorcio
+from prediccion import HORAS_DIA, factor_parada, demanda_base_dia, calcular_nivel
+
+# Estado de cada proceso del pool: el consorcio se carga una vez por proceso
+_consorcio = None
+_opciones = None
+
+
+def iniciar_proceso(id_consorcio, ruta_datos, ruta_modelo, opciones):
+    global _consorcio, _opciones
+    _consorcio = cargar_consorcio(id_consorcio, ruta_datos, ruta_modelo)
+    _opciones = opciones
+
+
+def ruta_particion(salida: str, fecha: str, linea: str, formato: str):
+    return os.path.join(salida, fecha, f"{linea.replace(os.sep, '_')}.{formato}")
+
+
+def exportar_particion(particion):
+    """Puntúa una (línea, fecha) con una sola llamada al modelo y la escribe a disco"""
+    linea, fecha = particion
+    destino = ruta_particion(_opciones["salida"], fecha, linea, _opciones["formato"])
+    paradas = _consorcio.datos_ctan[linea]["paradas"]
+
+    demanda_horaria = demanda_base_dia(
+        _consorcio.model, datetime.strptime(fecha, "%Y-%m-%d"),
+        _opciones["temperatura"], _opciones["lluvia"],
+        _opciones["evento_cercano"], _opciones["evento_tipo"]
+    )
+    factores = np.array([factor_parada(p.get("idParada", "N/A")) for p in paradas])
+    demanda = (demanda_horaria[:, None] * factores[None, :]).astype(int).ravel()
+
+    num_paradas = len(paradas)
+    df = pd.DataFrame({
+        "fecha": fecha,
+        "linea": linea,
+        "hora": np.repeat(np.arange(HORAS_DIA), num_paradas),
+        "id_parada": np.tile([str(p.get("idParada", "N/A")) for p in paradas], HORAS_DIA),
+        "sentido": np.tile([str(p.get("sentido", "1")) for p in paradas], HORAS_DIA),
+        "orden": np.tile([int(p.get("orden", 0)) for p in paradas], HORAS_DIA),
+        "demanda_predicha": demanda
+    })
+    df["nivel"] = df["demanda_predicha"].map(calcular_nivel)
+
+    # Escritura atómica: una partición a medias nunca cuenta como hecha al reanudar
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    temporal = destino + ".tmp"
+    if _opciones["formato"] == "parquet":
+        df.to_parquet(temporal, index=False)
+    else:
+        df.to_csv(temporal, index=False)
+    os.replace(temporal, destino)
+    return len(df)
+
+
+def comprobar_escenario(salida: str, escenario: dict):
+    """
+    Guarda el escenario en la primera ejecución. Al reanudar devuelve las
+    diferencias con el guardado (vacío si coincide), para no mezclar escenarios.
+    """
+    ruta = os.path.join(salida, "escenario.json")
+    if not os.path.exists(ruta):
+        os.makedirs(salida, exist_ok=True)
+        with open(ruta, "w") as f:
+            json.dump(escenario, f, indent=2)
+        return {}
+
+    with open(ruta) as f:
+        guardado = json.load(f)
+    return {
+        clave: (guardado.get(clave), valor)
+        for clave, valor in escenario.items()
+        if guardado.get(clave) != valor
+    }
+
+
+def generar_particiones(lineas, desde: datetime, hasta: datetime, salida: str, formato: str):
+    """Particiones pendientes, en orden de fecha; las ya escritas se saltan"""
+    dia = desde
+    while dia <= hasta:
+        fecha = dia.strftime("%Y-%m-%d")
+        for linea in lineas:
+            if not os.path.exists(ruta_particion(salida, fecha, linea, formato)):
+                yield linea, fecha
+        dia += timedelta(days=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta predicciones de demanda en lote")
+    parser.add_argument("--desde", required=True, help="Fecha inicial YYYY-MM-DD")
+    parser.add_argument("--hasta", required=True, help="Fecha final YYYY-MM-DD (incluida)")
+    parser.add_argument("--salida", required=True, help="Directorio de salida")
+    parser.add_argument("--formato", choices=["parquet", "csv"], default="parquet")
+    parser.add_argument("--consorcio", type=int,
+                        help="Lee ROUTIA_DIR_CONSORCIOS/{id}/ en lugar del directorio actual")
+    parser.add_argument("--lineas", help="Códigos de línea separados por comas (por defecto todas)")
+    parser.add_argument("--procesos", type=int, default=os.cpu_count())
+    parser.add_argument("--temperatura", type=float, default=22.0)
+    parser.add_argument("--lluvia", type=int, default=0)
+    parser.add_argument("--evento-cercano", type=int, default=0)
+    parser.add_argument("--evento-tipo", type=int, default=0)
+    args = parser.parse_args()
+
+    try:
+        desde = datetime.strptime(args.desde, "%Y-%m-%d")
+        hasta = datetime.strptime(args.hasta, "%Y-%m-%d")
+    except ValueError as e:
+        parser.error(f"Fecha no válida: {e}")
+    if hasta < desde:
+        parser.error("--hasta no puede ser anterior a --desde")
+    if args.procesos < 1:
+        parser.error("--procesos debe ser al menos 1")
+
+    if args.formato == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        parser.error("--formato parquet necesita pyarrow (pip install pyarrow) o usa --formato csv")
+
+    directorio = "."
+    if args.consorcio is not None:
+        directorio = os.path.join(os.getenv("ROUTIA_DIR_CONSORCIOS", "consorcios"), str(args.consorcio))
+    ruta_datos = os.path.join(directorio, "datos_ctan.pkl")
+    ruta_modelo = os.path.join(directorio, "modelo_routia.pkl")
+
+    if not os.path.exists(ruta_datos) or not os.path.exists(ruta_modelo):
+        parser.error(f"Consorcio no disponible: faltan datos_ctan.pkl o modelo_routia.pkl en {directorio}")
+
+    # El proceso principal solo necesita los códigos de línea: no carga el modelo
+    with open(ruta_datos, "rb") as f:
+        lineas = list(pickle.load(f))
+    if args.lineas:
+        pedidas = args.lineas.split(",")
+        desconocidas = [linea for linea in pedidas if linea not in lineas]
+        if desconocidas:
+            parser.error(f"Líneas desconocidas: {', '.join(desconocidas)}")
+        lineas = pedidas
+
+    opciones = {
+        "salida": args.salida,
+        "formato": args.formato,
+        "temperatura": args.temperatura,
+        "lluvia": args.lluvia,
+        "evento_cercano": args.evento_cercano,
+        "evento_tipo": args.evento_tipo
+    }
+    escenario = {
+        "consorcio": args.consorcio,
+        "temperatura": args.temperatura,
+        "lluvia": args.lluvia,
+        "evento_cercano": args.evento_cercano,
+        "evento_tipo": args.evento_tipo
+    }
+    diferencias = comprobar_escenario(args.salida, escenario)
+    if diferencias:
+        detalle = ", ".join(f"{clave}: {antes} -> {ahora}" for clave, (antes, ahora) in diferencias.items())
+        parser.error(f"{args.salida} contiene otro escenario ({detalle}); usa otra --salida")
+
+    particiones = generar_particiones(lineas, desde, hasta, args.salida, args.formato)
+
+    inicio = time.perf_counter()
+    num_particiones, num_filas = 0, 0
+    with Pool(args.procesos, initializer=iniciar_proceso,
+              initargs=(args.consorcio, ruta_datos, ruta_modelo, opciones)) as pool:
+        for filas in pool.imap_unordered(exportar_particion, particiones, chunksize=8):
+            num_particiones += 1
+            num_filas += filas
+
+    print(f"{num_particiones} particiones, {num_filas} filas -> {args.salida} "
+          f"({time.perf_counter() - inicio:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
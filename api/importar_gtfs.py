@@ -0,0 +1,215 @@
+"""
+Importa un feed GTFS (zip) y genera la red de líneas y paradas con la misma
+estructura que datos_ctan.pkl, sin descomprimir el zip.
+
+Uso:
+    python importar_gtfs.py feed.zip -o datos_ctan.pkl
+    python importar_gtfs.py feed.zip --consorcio 2
+"""
+import argparse
+import csv
+import io
+import os
+import pickle
+import sys
+import time
+import zipfile
+from collections import Counter
+
+MODOS_GTFS = {0: "Tranvía", 1: "Metro", 2: "Tren", 3: "Bus", 4: "Barco", 7: "Funicular"}
+
+
+def leer_csv(zf: zipfile.ZipFile, nombre: str):
+    """Itera las filas no vacías de un fichero del zip; la primera es la cabecera"""
+    with zf.open(nombre) as f:
+        for fila in csv.reader(io.TextIOWrapper(f, encoding="utf-8-sig", newline="")):
+            if fila:
+                yield fila
+
+
+def columnas(cabecera, *nombres):
+    """Índice de cada columna pedida (None si el feed no la incluye)"""
+    posiciones = {nombre.strip(): i for i, nombre in enumerate(cabecera)}
+    return [posiciones.get(nombre) for nombre in nombres]
+
+
+def leer_lineas(zf: zipfile.ZipFile):
+    filas = leer_csv(zf, "routes.txt")
+    i_id, i_corto, i_largo, i_tipo = columnas(next(filas), "route_id", "route_short_name",
+                                              "route_long_name", "route_type")
+    lineas = {}
+    for fila in filas:
+        corto = fila[i_corto] if i_corto is not None else ""
+        largo = fila[i_largo] if i_largo is not None else ""
+        tipo = int(fila[i_tipo]) if i_tipo is not None and fila[i_tipo] else 3
+        lineas[fila[i_id]] = {
+            "codigo": corto or fila[i_id],
+            "nombre": f"{corto} {largo}".strip() or fila[i_id],
+            "modos": MODOS_GTFS.get(tipo, "Bus")
+        }
+    return lineas
+
+
+def leer_viajes(zf: zipfile.ZipFile):
+    """trip_id -> (route_id, sentido)"""
+    filas = leer_csv(zf, "trips.txt")
+    i_viaje, i_linea, i_sentido = columnas(next(filas), "trip_id", "route_id", "direction_id")
+    viajes = {}
+    for fila in filas:
+        sentido = "2" if i_sentido is not None and fila[i_sentido] == "1" else "1"
+        viajes[fila[i_viaje]] = (fila[i_linea], sentido)
+    return viajes
+
+
+class StopTimesNoAgrupado(Exception):
+    """Un trip_id reaparece en stop_times.txt tras haberse cerrado"""
+
+
+def leer_secuencias(zf: zipfile.ZipFile, viajes: dict):
+    """
+    Por cada (línea, sentido) conserva la secuencia del viaje con más paradas.
+    Si stop_times.txt viene agrupado por trip_id (lo habitual) basta una pasada
+    con el viaje en curso en memoria; si no, se relee agrupando por viaje.
+    """
+    try:
+        return leer_secuencias_agrupadas(zf, viajes)
+    except StopTimesNoAgrupado as e:
+        print(f"Aviso: {e}; se relee stop_times.txt agrupando en memoria", file=sys.stderr)
+        return leer_secuencias_sin_agrupar(zf, viajes)
+
+
+def leer_secuencias_agrupadas(zf: zipfile.ZipFile, viajes: dict):
+    filas = leer_csv(zf, "stop_times.txt")
+    i_viaje, i_parada, i_secuencia = columnas(next(filas), "trip_id", "stop_id", "stop_sequence")
+
+    mejores = {}
+    # Mismo orden de memoria que `viajes`; permite detectar filas no agrupadas
+    cerrados = set()
+    viaje_actual, paradas_actual = None, []
+
+    def cerrar_viaje():
+        cerrados.add(viaje_actual)
+        guardar_si_mejor(mejores, viajes.get(viaje_actual), paradas_actual)
+
+    for fila in filas:
+        viaje = fila[i_viaje]
+        if viaje != viaje_actual:
+            if viaje_actual is not None:
+                cerrar_viaje()
+            if viaje in cerrados:
+                raise StopTimesNoAgrupado(f"el viaje {viaje} aparece en bloques no contiguos")
+            viaje_actual, paradas_actual = viaje, []
+        paradas_actual.append((int(fila[i_secuencia]), fila[i_parada]))
+    if viaje_actual is not None:
+        cerrar_viaje()
+    return mejores
+
+
+def leer_secuencias_sin_agrupar(zf: zipfile.ZipFile, viajes: dict):
+    filas = leer_csv(zf, "stop_times.txt")
+    i_viaje, i_parada, i_secuencia = columnas(next(filas), "trip_id", "stop_id", "stop_sequence")
+
+    por_viaje = {}
+    for fila in filas:
+        por_viaje.setdefault(fila[i_viaje], []).append((int(fila[i_secuencia]), fila[i_parada]))
+
+    mejores = {}
+    for viaje, paradas in por_viaje.items():
+        guardar_si_mejor(mejores, viajes.get(viaje), paradas)
+    return mejores
+
+
+def guardar_si_mejor(mejores: dict, clave, paradas: list):
+    """Sustituye la secuencia de (línea, sentido) si este viaje tiene más paradas"""
+    if clave is None or not paradas:
+        return
+    if len(paradas) > len(mejores.get(clave, ())):
+        paradas.sort()
+        mejores[clave] = [id_parada for _, id_parada in paradas]
+
+
+def leer_paradas(zf: zipfile.ZipFile, necesarias: set):
+    """Solo guarda las paradas que aparecen en alguna secuencia"""
+    filas = leer_csv(zf, "stops.txt")
+    i_id, i_nombre, i_lat, i_lon, i_zona = columnas(next(filas), "stop_id", "stop_name",
+                                                    "stop_lat", "stop_lon", "zone_id")
+    paradas = {}
+    for fila in filas:
+        if fila[i_id] in necesarias:
+            paradas[fila[i_id]] = {
+                "nombre": fila[i_nombre],
+                "latitud": fila[i_lat],
+                "longitud": fila[i_lon],
+                "idZona": fila[i_zona] if i_zona is not None else ""
+            }
+    return paradas
+
+
+def importar_gtfs(ruta_zip: str):
+    """Devuelve {codigo_linea: {"id", "codigo", "nombre", "paradas": [...]}}"""
+    with zipfile.ZipFile(ruta_zip) as zf:
+        lineas = leer_lineas(zf)
+        secuencias = leer_secuencias(zf, leer_viajes(zf))
+        paradas = leer_paradas(zf, {p for secuencia in secuencias.values() for p in secuencia})
+
+    # route_short_name puede repetirse entre operadores: entonces se usa route_id
+    cuenta = Counter(linea["codigo"] for linea in lineas.values())
+    repetidos = {codigo for codigo, n in cuenta.items() if n > 1}
+
+    datos = {}
+    for (id_linea, sentido), secuencia in sorted(secuencias.items()):
+        linea = lineas.get(id_linea)
+        if linea is None:
+            continue
+        codigo = id_linea if linea["codigo"] in repetidos else linea["codigo"]
+        entrada = datos.setdefault(codigo, {
+            "id": id_linea,
+            "codigo": codigo,
+            "nombre": linea["nombre"],
+            "paradas": []
+        })
+        for orden, id_parada in enumerate(secuencia, start=1):
+            parada = paradas.get(id_parada)
+            if parada is None:
+                continue
+            entrada["paradas"].append({
+                "idParada": id_parada,
+                "idLinea": id_linea,
+                "idZona": parada["idZona"],
+                "nombre": parada["nombre"],
+                "latitud": parada["latitud"],
+                "longitud": parada["longitud"],
+                "sentido": sentido,
+                "orden": orden,
+                "modos": linea["modos"]
+            })
+    return datos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa un feed GTFS a la red de líneas de RoutIA")
+    parser.add_argument("gtfs", help="Ruta al fichero GTFS .zip")
+    destino = parser.add_mutually_exclusive_group(required=True)
+    destino.add_argument("-o", "--salida", help="Fichero .pkl de salida")
+    destino.add_argument("--consorcio", type=int,
+                         help="Escribe en ROUTIA_DIR_CONSORCIOS/{id}/datos_ctan.pkl")
+    args = parser.parse_args()
+
+    salida = args.salida
+    if salida is None:
+        directorio = os.path.join(os.getenv("ROUTIA_DIR_CONSORCIOS", "consorcios"), str(args.consorcio))
+        os.makedirs(directorio, exist_ok=True)
+        salida = os.path.join(directorio, "datos_ctan.pkl")
+
+    inicio = time.perf_counter()
+    datos = importar_gtfs(args.gtfs)
+    with open(salida, "wb") as f:
+        pickle.dump(datos, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    num_paradas = sum(len(linea["paradas"]) for linea in datos.values())
+    print(f"{len(datos)} líneas, {num_paradas} paradas -> {salida} "
+          f"({time.perf_counter() - inicio:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,67 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel
 from typing import Optional, List
-import pickle
+import os
 import numpy as np
 from datetime import datetime, timedelta
 import json
 import requests
 
+from admision import ControlAdmision, PeticionRechazada
+from consorcios import AlmacenConsorcios, ConsorcioNoEncontrado, cargar_consorcio
+from perfil_carga import construir_red, calcular_perfiles, frecuencias
+from prediccion import HORAS_DIA, generar_demanda_base, demanda_base_dia, demanda_desde_cubo, calcular_nivel
+
 app = FastAPI(
     title="RoutIA API",
     description="API de predicción de demanda para transporte público - Datos reales CTAN",
     version="2.0.0"
 )
 
-# Cargar modelo y datos
-with open("modelo_routia.pkl", "rb") as f:
-    model = pickle.load(f)
-
-with open("datos_ctan.pkl", "rb") as f:
-    datos_ctan = pickle.load(f)
-
 # Configuración
 BASE_URL_CTAN = "http://api.ctan.es/v1"
 ID_CONSORCIO_SEVILLA = 1
 
+# Consorcios: cada uno en DIR_CONSORCIOS/{id}/ con datos_ctan.pkl y modelo_routia.pkl.
+# Sevilla usa los ficheros del directorio de trabajo si no tiene carpeta propia.
+DIR_CONSORCIOS = os.getenv("ROUTIA_DIR_CONSORCIOS", "consorcios")
+MEMORIA_CONSORCIOS = int(os.getenv("ROUTIA_MEMORIA_CONSORCIOS_MB", "512")) * 1024 * 1024
+CACHE_CONSORCIO = int(os.getenv("ROUTIA_CACHE_CONSORCIO_MB", "32")) * 1024 * 1024
+
+# Control de admisión (ver admision.py)
+MAX_CONCURRENCIA = int(os.getenv("ROUTIA_MAX_CONCURRENCIA", "8"))
+MAX_COLA = int(os.getenv("ROUTIA_MAX_COLA", "64"))
+ESPERA_MAXIMA = float(os.getenv("ROUTIA_ESPERA_MAXIMA", "0.5"))
+MODO_DEGRADADO = os.getenv("ROUTIA_MODO_DEGRADADO", "0") == "1"
+
+# /health no pasa por el limitador: las sondas de vida deben responder en saturación
+RUTAS_SIN_ADMISION = {"/health"}
+
+# Prioridad por ruta y por tipo de cliente (menor = más prioritaria)
+PRIORIDAD_RUTAS = {"/": 0, "/lineas": 1}
+PRIORIDAD_CLIENTES = {"interactivo": 1, "lote": 3}
+PRIORIDAD_POR_DEFECTO = 2
+
+admision = ControlAdmision(MAX_CONCURRENCIA, MAX_COLA, ESPERA_MAXIMA)
+
+def cargar_datos_consorcio(id_consorcio: int):
+    """Resuelve las rutas de un consorcio y lo carga desde disco"""
+    directorio = os.path.join(DIR_CONSORCIOS, str(id_consorcio))
+    if id_consorcio == ID_CONSORCIO_SEVILLA and not os.path.isdir(directorio):
+        directorio = "."
+    return cargar_consorcio(
+        id_consorcio,
+        os.path.join(directorio, "datos_ctan.pkl"),
+        os.path.join(directorio, "modelo_routia.pkl"),
+        max_bytes_cache=CACHE_CONSORCIO
+    )
+
+almacen = AlmacenConsorcios(cargar_datos_consorcio, MEMORIA_CONSORCIOS, fijos=[ID_CONSORCIO_SEVILLA])
+
+# Cargar modelo y datos del consorcio por defecto
+almacen.obtener(ID_CONSORCIO_SEVILLA)
+
 class PrediccionRequest(BaseModel):
     linea: str
     fecha: str
@@ -51,6 +89,94 @@ class PrediccionResponse(BaseModel):
     precision_modelo: float
     fuente_datos: str
 
+def obtener_consorcio(id_consorcio: int):
+    try:
+        return almacen.obtener(id_consorcio)
+    except ConsorcioNoEncontrado as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+def separar_consorcio(path: str):
+    """Divide /consorcios/{id}/resto en (id, /resto); sin prefijo es Sevilla"""
+    partes = path.split("/", 3)
+    if len(partes) == 4 and partes[1] == "consorcios" and partes[2].isdigit():
+        return int(partes[2]), "/" + partes[3]
+    return ID_CONSORCIO_SEVILLA, path
+
+def prioridad_peticion(request: Request):
+    """Prioridad según la ruta o, si no está fijada, la cabecera X-RoutIA-Cliente"""
+    _, ruta = separar_consorcio(request.url.path)
+    if ruta in PRIORIDAD_RUTAS:
+        return PRIORIDAD_RUTAS[ruta]
+    cliente = request.headers.get("x-routia-cliente", "")
+    return PRIORIDAD_CLIENTES.get(cliente, PRIORIDAD_POR_DEFECTO)
+
+@app.middleware("http")
+async def control_admision(request: Request, call_next):
+    if request.url.path in RUTAS_SIN_ADMISION:
+        return await call_next(request)
+
+    try:
+        await admision.adquirir(prioridad_peticion(request))
+    except PeticionRechazada as e:
+        if MODO_DEGRADADO:
+            degradada = respuesta_degradada(request.url.path)
+            if degradada is not None:
+                return degradada
+        return JSONResponse(
+            status_code=503,
+            content={"detail": f"Servicio saturado: {e.motivo}"},
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+    try:
+        response = await call_next(request)
+    finally:
+        admision.liberar()
+
+    # El consorcio se toma de la ruta ya resuelta, no del texto del path
+    ruta = request.scope.get("route")
+    if (MODO_DEGRADADO and response.status_code == 200
+            and getattr(ruta, "endpoint", None) in (predecir_demanda, predecir_demanda_consorcio)):
+        cuerpo = b"".join([chunk async for chunk in response.body_iterator])
+        params = request.path_params
+        consorcio = almacen.cargado(int(params.get("id_consorcio", ID_CONSORCIO_SEVILLA)))
+        if consorcio is not None:
+            clave = clave_demanda(params["linea"], params["fecha"], params["hora_inicio"], params["hora_fin"])
+            consorcio.cache_respuestas.guardar(clave, cuerpo)
+            almacen.ajustar_memoria()
+        return Response(content=cuerpo, status_code=200, media_type="application/json")
+    return response
+
+def clave_demanda(linea: str, fecha: str, hora_inicio: str, hora_fin: str):
+    return f"{linea}/{fecha}/{hora_inicio}/{hora_fin}"
+
+def respuesta_degradada(path: str):
+    """Sirve /demanda desde la cache o el cubo precalculado, sin inferencia en vivo"""
+    id_consorcio, ruta = separar_consorcio(path)
+    # En saturación no se cargan consorcios: solo se sirven los ya presentes
+    consorcio = almacen.cargado(id_consorcio)
+    if consorcio is None or not ruta.startswith("/demanda/"):
+        return None
+
+    partes = ruta.strip("/").split("/")
+    if len(partes) != 5:
+        return None
+
+    cuerpo = consorcio.cache_respuestas.obtener(clave_demanda(*partes[1:]))
+    if cuerpo is not None:
+        return Response(content=cuerpo, media_type="application/json",
+                        headers={"X-RoutIA-Degradado": "cache"})
+
+    try:
+        resultado = calcular_prediccion(
+            consorcio, *partes[1:],
+            demanda_base=lambda fecha, hora: demanda_desde_cubo(consorcio, fecha, hora)
+        )
+    except ValueError:
+        return None
+    almacen.ajustar_memoria()
+    return JSONResponse(content=resultado, headers={"X-RoutIA-Degradado": "cubo"})
+
 @app.get("/")
 def root():
     return {
@@ -59,6 +185,9 @@ def root():
         "endpoints": [
             "/demanda/{linea}/{fecha}/{hora_inicio}/{hora_fin}",
             "/lineas",
+            "/perfil_carga/{fecha}",
+            "/consorcios/{id_consorcio}/...",
+            "/consorcios",
             "/health"
         ],
         "fuente_datos": "Consorcio de Transportes de Andalucía (CTAN)"
@@ -66,13 +195,29 @@ def root():
 
 @app.get("/health")
 def health_check():
-    return {"status": "ok", "modelo_cargado": model is not None}
+    return {
+        "status": "ok",
+        "modelo_cargado": almacen.cargado(ID_CONSORCIO_SEVILLA) is not None,
+        "modo_degradado": MODO_DEGRADADO,
+        "admision": admision.estadisticas()
+    }
+
+@app.get("/consorcios")
+def estadisticas_consorcios():
+    """Memoria y aciertos de cache por consorcio"""
+    return almacen.estadisticas()
 
 @app.get("/lineas")
 def obtener_lineas():
     """Obtiene todas las líneas disponibles"""
+    return obtener_lineas_consorcio(ID_CONSORCIO_SEVILLA)
+
+@app.get("/consorcios/{id_consorcio}/lineas")
+def obtener_lineas_consorcio(id_consorcio: int):
+    """Obtiene todas las líneas disponibles de un consorcio"""
+    consorcio = obtener_consorcio(id_consorcio)
     lineas = []
-    for codigo, datos in datos_ctan.items():
+    for codigo, datos in consorcio.datos_ctan.items():
         lineas.append({
             "codigo": codigo,
             "nombre": datos["nombre"],
@@ -86,71 +231,195 @@ def predecir_demanda(linea: str, fecha: str, hora_inicio: str, hora_fin: str):
     Predice la demanda para una línea en una fecha y franja horaria específicas.
     Usa datos reales del Consorcio de Transportes de Andalucía.
     """
+    return predecir_demanda_consorcio(ID_CONSORCIO_SEVILLA, linea, fecha, hora_inicio, hora_fin)
+
+@app.get("/consorcios/{id_consorcio}/demanda/{linea}/{fecha}/{hora_inicio}/{hora_fin}", response_model=PrediccionResponse)
+def predecir_demanda_consorcio(id_consorcio: int, linea: str, fecha: str, hora_inicio: str, hora_fin: str):
+    """Predice la demanda de una línea de un consorcio concreto"""
+    consorcio = obtener_consorcio(id_consorcio)
     try:
-        # Verificar si la línea existe
-        if linea not in datos_ctan:
-            # Si no está en nuestros datos, usar datos simulados
-            return predecir_con_datos_simulados(linea, fecha, hora_inicio, hora_fin)
+        return calcular_prediccion(consorcio, linea, fecha, hora_inicio, hora_fin)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        datos_linea = datos_ctan[linea]
+def calcular_prediccion(consorcio, linea: str, fecha: str, hora_inicio: str, hora_fin: str, demanda_base=None):
+    """Construye la respuesta de /demanda; `demanda_base` permite sustituir el modelo"""
+    if demanda_base is None:
+        demanda_base = lambda fecha_dt, hora: generar_demanda_base(consorcio.model, fecha_dt, hora)
 
-        # Parsear fecha y horas
-        fecha_dt = datetime.strptime(fecha, "%Y-%m-%d")
-        hora_inicio_dt = datetime.strptime(hora_inicio, "%H_%M")
-        hora_fin_dt = datetime.strptime(hora_fin, "%H_%M")
-
-        # Generar predicciones para cada parada
-        predicciones_paradas = []
-        total_viajeros = 0
-
-        for parada in datos_linea["paradas"]:
-            # Generar datos históricos simulados (en producción vendrían de BD)
-            demanda_base = generar_demanda_base(fecha_dt, hora_inicio_dt.hour)
-
-            # Añadir variación por parada
-            factor_parada = np.random.uniform(0.7, 1.3)
-            demanda_predicha = int(demanda_base * factor_parada)
-
-            # Generar históricos
-            hist_anio = int(demanda_predicha * np.random.uniform(0.8, 1.2))
-            hist_semana = int(demanda_predicha * np.random.uniform(0.7, 1.3))
-            hist_dia = int(demanda_predicha * np.random.uniform(0.9, 1.1))
-
-            variacion = round(((demanda_predicha - hist_anio) / max(hist_anio, 1)) * 100, 1)
-
-            predicciones_paradas.append({
-                "id_parada": str(parada.get("idParada", "N/A")),
-                "nombre": parada.get("nombre", "Desconocida"),
-                "latitud": float(parada.get("latitud", 0)),
-                "longitud": float(parada.get("longitud", 0)),
-                "viajeros_historico": {
-                    "mismo_dia_anio_anterior": hist_anio,
-                    "semana_anterior": hist_semana,
-                    "dia_anterior": hist_dia
-                },
-                "demanda_predicha": demanda_predicha,
-                "variacion": variacion,
-                "nivel": calcular_nivel(demanda_predicha)
-            })
-
-            total_viajeros += demanda_predicha
+    # Verificar si la línea existe
+    if linea not in consorcio.datos_ctan:
+        # Si no está en nuestros datos, usar datos simulados
+        return predecir_con_datos_simulados(linea, fecha, hora_inicio, hora_fin, demanda_base)
+
+    datos_linea = consorcio.datos_ctan[linea]
+
+    # Parsear fecha y horas
+    fecha_dt = datetime.strptime(fecha, "%Y-%m-%d")
+    hora_inicio_dt = datetime.strptime(hora_inicio, "%H_%M")
+    hora_fin_dt = datetime.strptime(hora_fin, "%H_%M")
+
+    # Generar predicciones para cada parada
+    predicciones_paradas = []
+    total_viajeros = 0
+
+    for parada in datos_linea["paradas"]:
+        # Generar datos históricos simulados (en producción vendrían de BD)
+        demanda_base_parada = demanda_base(fecha_dt, hora_inicio_dt.hour)
+
+        # Añadir variación por parada
+        factor_parada = np.random.uniform(0.7, 1.3)
+        demanda_predicha = int(demanda_base_parada * factor_parada)
 
+        # Generar históricos
+        hist_anio = int(demanda_predicha * np.random.uniform(0.8, 1.2))
+        hist_semana = int(demanda_predicha * np.random.uniform(0.7, 1.3))
+        hist_dia = int(demanda_predicha * np.random.uniform(0.9, 1.1))
+
+        variacion = round(((demanda_predicha - hist_anio) / max(hist_anio, 1)) * 100, 1)
+
+        predicciones_paradas.append({
+            "id_parada": str(parada.get("idParada", "N/A")),
+            "nombre": parada.get("nombre", "Desconocida"),
+            "latitud": float(parada.get("latitud", 0)),
+            "longitud": float(parada.get("longitud", 0)),
+            "viajeros_historico": {
+                "mismo_dia_anio_anterior": hist_anio,
+                "semana_anterior": hist_semana,
+                "dia_anterior": hist_dia
+            },
+            "demanda_predicha": demanda_predicha,
+            "variacion": variacion,
+            "nivel": calcular_nivel(demanda_predicha)
+        })
+
+        total_viajeros += demanda_predicha
+
+    return {
+        "linea": linea,
+        "nombre_linea": datos_linea["nombre"],
+        "fecha": fecha,
+        "hora_inicio": hora_inicio.replace("_", ":"),
+        "hora_fin": hora_fin.replace("_", ":"),
+        "paradas": predicciones_paradas,
+        "total_viajeros": total_viajeros,
+        "precision_modelo": 88.48,
+        "fuente_datos": "CTAN + Modelo ML RoutIA"
+    }
+
+@app.get("/perfil_carga/{fecha}")
+def perfil_carga(
+    fecha: str,
+    capacidad: int = 80,
+    frecuencia_minima: int = 1,
+    temperatura: float = 22.0,
+    lluvia: int = 0,
+    evento_cercano: int = 0,
+    evento_tipo: int = 0,
+    detalle: bool = False
+):
+    """
+    Perfil de carga a bordo por línea y hora para todo el día y toda la red,
+    y frecuencia necesaria (vehículos/hora) para la capacidad indicada.
+    """
+    return perfil_carga_consorcio(ID_CONSORCIO_SEVILLA, fecha, capacidad, frecuencia_minima,
+                                  temperatura, lluvia, evento_cercano, evento_tipo, detalle)
+
+@app.get("/consorcios/{id_consorcio}/perfil_carga/{fecha}")
+def perfil_carga_consorcio(
+    id_consorcio: int,
+    fecha: str,
+    capacidad: int = 80,
+    frecuencia_minima: int = 1,
+    temperatura: float = 22.0,
+    lluvia: int = 0,
+    evento_cercano: int = 0,
+    evento_tipo: int = 0,
+    detalle: bool = False
+):
+    """Perfil de carga y frecuencia necesaria para la red de un consorcio"""
+    if capacidad <= 0:
+        raise HTTPException(status_code=422, detail="capacidad debe ser mayor que 0")
+    if frecuencia_minima < 0:
+        raise HTTPException(status_code=422, detail="frecuencia_minima no puede ser negativa")
+    try:
+        fecha_dt = datetime.strptime(fecha, "%Y-%m-%d")
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    consorcio = obtener_consorcio(id_consorcio)
+    if consorcio.red_carga is None:
+        consorcio.red_carga = construir_red(consorcio.datos_ctan)
+        almacen.ajustar_memoria()
+    red_carga = consorcio.red_carga
+    datos_ctan = consorcio.datos_ctan
+    if not red_carga["tramos"]:
         return {
-            "linea": linea,
-            "nombre_linea": datos_linea["nombre"],
             "fecha": fecha,
-            "hora_inicio": hora_inicio.replace("_", ":"),
-            "hora_fin": hora_fin.replace("_", ":"),
-            "paradas": predicciones_paradas,
-            "total_viajeros": total_viajeros,
-            "precision_modelo": 88.48,
+            "capacidad": capacidad,
+            "lineas": [],
+            "total_lineas": 0,
             "fuente_datos": "CTAN + Modelo ML RoutIA"
         }
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    demanda_horaria = demanda_base_dia(consorcio.model, fecha_dt, temperatura, lluvia, evento_cercano, evento_tipo)
+    subidas, bajadas, carga = calcular_perfiles(red_carga, demanda_horaria)
+    carga_maxima, vehiculos = frecuencias(red_carga, carga, capacidad, frecuencia_minima)
+
+    lineas = {}
+    for t, (codigo, sentido) in enumerate(red_carga["tramos"]):
+        linea = lineas.setdefault(codigo, {
+            "linea": codigo,
+            "nombre_linea": datos_ctan[codigo]["nombre"],
+            "carga": np.zeros(HORAS_DIA),
+            "vehiculos": np.zeros(HORAS_DIA, dtype=int),
+            "sentido_critico": np.full(HORAS_DIA, sentido, dtype=object),
+            "perfil": {}
+        })
+        # La línea se dimensiona por el sentido más cargado en cada hora
+        mayor = carga_maxima[:, t] > linea["carga"]
+        linea["sentido_critico"][mayor] = sentido
+        linea["carga"] = np.maximum(linea["carga"], carga_maxima[:, t])
+        linea["vehiculos"] = np.maximum(linea["vehiculos"], vehiculos[:, t])
+
+        if detalle:
+            tramo = slice(red_carga["inicios"][t], red_carga["inicios"][t] + red_carga["longitudes"][t])
+            linea["perfil"][sentido] = {
+                "paradas": red_carga["ids_parada"][tramo],
+                "subidas": np.rint(subidas[:, tramo]).astype(int).tolist(),
+                "bajadas": np.rint(bajadas[:, tramo]).astype(int).tolist(),
+                "carga": np.rint(carga[:, tramo]).astype(int).tolist()
+            }
+
+    resultado = []
+    for linea in lineas.values():
+        franjas = [{
+            "hora": hora,
+            "carga_maxima": int(round(linea["carga"][hora])),
+            "sentido_critico": linea["sentido_critico"][hora],
+            "vehiculos_hora": int(linea["vehiculos"][hora]),
+            "intervalo_minutos": round(60 / linea["vehiculos"][hora], 1) if linea["vehiculos"][hora] else None
+        } for hora in range(HORAS_DIA)]
+        entrada = {
+            "linea": linea["linea"],
+            "nombre_linea": linea["nombre_linea"],
+            "carga_maxima_dia": int(round(linea["carga"].max())),
+            "vehiculos_hora_punta": int(linea["vehiculos"].max()),
+            "franjas": franjas
+        }
+        if detalle:
+            entrada["perfil"] = linea["perfil"]
+        resultado.append(entrada)
+
+    return {
+        "fecha": fecha,
+        "capacidad": capacidad,
+        "lineas": resultado,
+        "total_lineas": len(resultado),
+        "fuente_datos": "CTAN + Modelo ML RoutIA"
+    }
 
-def predecir_con_datos_simulados(linea: str, fecha: str, hora_inicio: str, hora_fin: str):
+def predecir_con_datos_simulados(linea: str, fecha: str, hora_inicio: str, hora_fin: str, demanda_base):
     """Genera predicciones con datos simulados para líneas no en CTAN"""
 
     paradas_simuladas = [
@@ -167,7 +436,7 @@ def predecir_con_datos_simulados(linea: str, fecha: str, hora_inicio: str, hora_
     total = 0
 
     for parada in paradas_simuladas:
-        demanda = generar_demanda_base(fecha_dt, hora)
+        demanda = demanda_base(fecha_dt, hora)
         predicciones.append({
             "id_parada": parada["id"],
             "nombre": parada["nombre"],
@@ -196,38 +465,6 @@ def predecir_con_datos_simulados(linea: str, fecha: str, hora_inicio: str, hora_
         "fuente_datos": "Modelo ML RoutIA (Simulado)"
     }
 
-def generar_demanda_base(fecha: datetime, hora: int):
-    """Genera demanda base usando el modelo ML"""
-
-    # Crear features
-    es_festivo = 1 if fecha.weekday() >= 5 else 0
-    temperatura = 22 + np.random.normal(0, 5)
-    lluvia = np.random.choice([0, 1], p=[0.8, 0.2])
-    evento_cercano = np.random.choice([0, 1], p=[0.85, 0.15])
-    evento_tipo = np.random.choice([0, 1, 2, 3])
-
-    features = [
-        hora,                    # hora
-        fecha.weekday(),         # dia_semana
-        fecha.month,             # mes
-        es_festivo,              # es_festivo
-        temperatura,             # temperatura
-        lluvia,                  # lluvia
-        evento_cercano,          # evento_cercano
-        evento_tipo              # evento_tipo_cod
-    ]
-
-    return max(0, int(model.predict([features])[0]))
-
-def calcular_nivel(demanda: int):
-    """Calcula el nivel de demanda"""
-    if demanda < 50:
-        return "Baja"
-    elif demanda < 100:
-        return "Media"
-    else:
-        return "Alta"
-
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
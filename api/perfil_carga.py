@@ -0,0 +1,86 @@
+import sys
+import numpy as np
+
+from prediccion import factor_parada
+
+
+def construir_red(datos_ctan: dict):
+    """
+    Aplana la red en arrays contiguos: un tramo por (línea, sentido) con sus
+    paradas ordenadas por `orden`. Se calcula una vez y se reutiliza.
+    """
+    tramos, ids, factores, posiciones, longitudes = [], [], [], [], []
+
+    for codigo, datos_linea in datos_ctan.items():
+        por_sentido = {}
+        for parada in datos_linea["paradas"]:
+            por_sentido.setdefault(str(parada.get("sentido", "1")), []).append(parada)
+
+        for sentido, paradas in sorted(por_sentido.items()):
+            paradas = sorted(paradas, key=lambda p: int(p.get("orden", 0)))
+            tramos.append((codigo, sentido))
+            longitudes.append(len(paradas))
+            for i, parada in enumerate(paradas):
+                id_parada = str(parada.get("idParada", "N/A"))
+                ids.append(id_parada)
+                factores.append(factor_parada(id_parada))
+                posiciones.append(i)
+
+    longitudes = np.array(longitudes, dtype=np.int64)
+    inicios = (np.cumsum(longitudes) - longitudes).astype(np.int64)
+    posiciones = np.array(posiciones, dtype=np.float64)
+    factores = np.array(factores, dtype=np.float64)
+    tramo_parada = np.repeat(np.arange(len(tramos)), longitudes)
+    ultima = posiciones == (longitudes[tramo_parada] - 1)
+
+    # Subidas: todas las paradas salvo la última del tramo
+    peso_subida = np.where(ultima, 0.0, factores)
+    # Bajadas: crecen con la posición en el tramo y suman lo mismo que las subidas
+    peso_bajada = factores * posiciones
+    # Una red sin paradas (feed vacío o filtrado) no tiene tramos que escalar
+    if tramos:
+        suma_subida = np.add.reduceat(peso_subida, inicios)
+        suma_bajada = np.add.reduceat(peso_bajada, inicios)
+        escala = np.divide(suma_subida, suma_bajada, out=np.zeros_like(suma_subida), where=suma_bajada > 0)
+        peso_bajada = peso_bajada * escala[tramo_parada]
+
+    red = {
+        "tramos": tramos,
+        "ids_parada": ids,
+        "inicios": inicios,
+        "longitudes": longitudes,
+        "tramo_parada": tramo_parada,
+        "peso_subida": peso_subida,
+        "peso_bajada": peso_bajada
+    }
+    # Memoria aproximada de la red, para el presupuesto por consorcio
+    red["tamano_bytes"] = (
+        sum(v.nbytes for v in red.values() if isinstance(v, np.ndarray))
+        + sys.getsizeof(ids) + sum(sys.getsizeof(i) for i in ids)
+        + sys.getsizeof(tramos) + 64 * len(tramos)
+    )
+    return red
+
+
+def calcular_perfiles(red: dict, demanda_horaria: np.ndarray):
+    """
+    Carga a bordo por franja horaria y parada, shape (24, num_paradas).
+    `demanda_horaria` es la demanda base por hora (24,) que predice el modelo.
+    """
+    demanda_horaria = np.asarray(demanda_horaria, dtype=np.float64)[:, None]
+    subidas = demanda_horaria * red["peso_subida"]
+    bajadas = demanda_horaria * red["peso_bajada"]
+
+    # Suma acumulada global y se resta el acumulado previo al inicio de cada tramo
+    acumulado = np.cumsum(subidas - bajadas, axis=1)
+    previo = np.concatenate([np.zeros((acumulado.shape[0], 1)), acumulado[:, :-1]], axis=1)
+    base_tramo = previo[:, red["inicios"]]
+    carga = acumulado - base_tramo[:, red["tramo_parada"]]
+    return subidas, bajadas, np.maximum(carga, 0)
+
+
+def frecuencias(red: dict, carga: np.ndarray, capacidad: int, frecuencia_minima: int = 1):
+    """Carga máxima por tramo y hora, y vehículos/hora necesarios para cubrirla"""
+    carga_maxima = np.maximum.reduceat(carga, red["inicios"], axis=1)
+    vehiculos = np.maximum(np.ceil(carga_maxima / capacidad), frecuencia_minima).astype(int)
+    return carga_maxima, vehiculos
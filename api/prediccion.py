@@ -0,0 +1,78 @@
+import zlib
+from datetime import datetime
+import numpy as np
+
+HORAS_DIA = 24
+
+
+def factor_parada(id_parada: str):
+    """Factor de atracción estable por parada (mismo rango que /demanda: 0.7 - 1.3)"""
+    return 0.7 + 0.6 * (zlib.crc32(str(id_parada).encode()) % 1000) / 999
+
+
+def generar_demanda_base(model, fecha: datetime, hora: int):
+    """Genera demanda base usando el modelo ML"""
+
+    # Crear features
+    es_festivo = 1 if fecha.weekday() >= 5 else 0
+    temperatura = 22 + np.random.normal(0, 5)
+    lluvia = np.random.choice([0, 1], p=[0.8, 0.2])
+    evento_cercano = np.random.choice([0, 1], p=[0.85, 0.15])
+    evento_tipo = np.random.choice([0, 1, 2, 3])
+
+    features = [
+        hora,                    # hora
+        fecha.weekday(),         # dia_semana
+        fecha.month,             # mes
+        es_festivo,              # es_festivo
+        temperatura,             # temperatura
+        lluvia,                  # lluvia
+        evento_cercano,          # evento_cercano
+        evento_tipo              # evento_tipo_cod
+    ]
+
+    return max(0, int(model.predict([features])[0]))
+
+
+def demanda_base_dia(model, fecha: datetime, temperatura: float, lluvia: int, evento_cercano: int, evento_tipo: int):
+    """Demanda base de las 24 horas de un día en una sola llamada al modelo"""
+    horas = np.arange(HORAS_DIA)
+    features = np.column_stack([
+        horas,
+        np.full(HORAS_DIA, fecha.weekday()),
+        np.full(HORAS_DIA, fecha.month),
+        np.full(HORAS_DIA, 1 if fecha.weekday() >= 5 else 0),
+        np.full(HORAS_DIA, temperatura),
+        np.full(HORAS_DIA, lluvia),
+        np.full(HORAS_DIA, evento_cercano),
+        np.full(HORAS_DIA, evento_tipo)
+    ])
+    return np.maximum(0, model.predict(features))
+
+
+def demanda_desde_cubo(consorcio, fecha: datetime, hora: int):
+    """Demanda base precalculada por (hora, día de semana, mes) con condiciones medias"""
+    if consorcio.cubo_demanda is None:
+        horas, dias, meses = np.meshgrid(np.arange(24), np.arange(7), np.arange(1, 13), indexing="ij")
+        features = np.column_stack([
+            horas.ravel(),
+            dias.ravel(),
+            meses.ravel(),
+            (dias.ravel() >= 5).astype(int),
+            np.full(horas.size, 22.0),  # temperatura media
+            np.zeros(horas.size),       # lluvia
+            np.zeros(horas.size),       # evento_cercano
+            np.zeros(horas.size)        # evento_tipo_cod
+        ])
+        consorcio.cubo_demanda = np.maximum(0, consorcio.model.predict(features)).astype(int).reshape(24, 7, 12)
+    return int(consorcio.cubo_demanda[hora, fecha.weekday(), fecha.month - 1])
+
+
+def calcular_nivel(demanda: int):
+    """Calcula el nivel de demanda"""
+    if demanda < 50:
+        return "Baja"
+    elif demanda < 100:
+        return "Media"
+    else:
+        return "Alta"
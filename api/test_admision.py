@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+from admision import ControlAdmision, PeticionRechazada
+
+
+def test_espera_cancelada_no_pierde_hueco():
+    async def escenario():
+        admision = ControlAdmision(max_concurrencia=1, max_cola=4, espera_maxima=0.2)
+        await admision.adquirir(2)
+
+        esperando = asyncio.create_task(admision.adquirir(2))
+        await asyncio.sleep(0)
+        esperando.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await esperando
+
+        admision.liberar()
+        await admision.adquirir(2)
+        assert admision.estadisticas()["en_curso"] == 1
+        assert admision.estadisticas()["en_cola"] == 0
+
+    asyncio.run(escenario())
+
+
+def test_cancelada_tras_recibir_hueco_lo_devuelve():
+    async def escenario():
+        admision = ControlAdmision(max_concurrencia=1, max_cola=4, espera_maxima=0.2)
+        await admision.adquirir(2)
+
+        esperando = asyncio.create_task(admision.adquirir(2))
+        await asyncio.sleep(0)
+        # liberar() cede el hueco y la tarea se cancela antes de reanudarse
+        admision.liberar()
+        esperando.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await esperando
+
+        assert admision.estadisticas()["en_curso"] == 0
+        await admision.adquirir(2)
+
+    asyncio.run(escenario())
+
+
+def test_cola_llena_rechaza():
+    async def escenario():
+        admision = ControlAdmision(max_concurrencia=1, max_cola=0, espera_maxima=0.05)
+        await admision.adquirir(2)
+        with pytest.raises(PeticionRechazada):
+            await admision.adquirir(2)
+
+    asyncio.run(escenario())
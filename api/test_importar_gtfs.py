@@ -0,0 +1,80 @@
+import io
+import random
+import zipfile
+
+from importar_gtfs import importar_gtfs
+
+ROUTES = """route_id,route_short_name,route_long_name,route_type
+R1,L1,Centro - Norte,3
+R2,L2,Centro - Sur,3
+R3,L2,Circular,0
+"""
+
+TRIPS = """route_id,service_id,trip_id,direction_id
+R1,S,T1,0
+R1,S,T2,1
+R1,S,T3,0
+R2,S,T4,0
+R3,S,T5,0
+"""
+
+STOPS = """stop_id,stop_name,stop_lat,stop_lon,zone_id
+A,Parada A,37.1,-5.9,Z1
+B,Parada B,37.2,-5.9,Z1
+C,Parada C,37.3,-5.9,Z2
+D,Parada D,37.4,-5.9,Z2
+"""
+
+# T3 tiene menos paradas que T1 (mismo sentido): debe quedarse la de T1
+STOP_TIMES = [
+    ("T1", "A", 1), ("T1", "B", 2), ("T1", "C", 3),
+    ("T2", "C", 1), ("T2", "B", 2), ("T2", "A", 3),
+    ("T3", "A", 1), ("T3", "C", 2),
+    ("T4", "D", 1), ("T4", "A", 2),
+    ("T5", "B", 1), ("T5", "D", 2),
+]
+
+
+def crear_zip(filas_stop_times, lineas_en_blanco=False):
+    stop_times = "trip_id,stop_id,stop_sequence\n"
+    for viaje, parada, secuencia in filas_stop_times:
+        stop_times += f"{viaje},{parada},{secuencia}\n"
+        if lineas_en_blanco:
+            stop_times += "\n"
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        zf.writestr("routes.txt", ROUTES)
+        zf.writestr("trips.txt", TRIPS)
+        zf.writestr("stops.txt", STOPS)
+        zf.writestr("stop_times.txt", stop_times)
+    buffer.seek(0)
+    return buffer
+
+
+def secuencia(datos, codigo, sentido):
+    return [(p["orden"], p["idParada"]) for p in datos[codigo]["paradas"] if p["sentido"] == sentido]
+
+
+def test_filas_agrupadas():
+    datos = importar_gtfs(crear_zip(STOP_TIMES))
+
+    # L2 se repite entre R2 y R3: ambas se indexan por route_id
+    assert set(datos) == {"L1", "R2", "R3"}
+    assert secuencia(datos, "L1", "1") == [(1, "A"), (2, "B"), (3, "C")]
+    assert secuencia(datos, "L1", "2") == [(1, "C"), (2, "B"), (3, "A")]
+    assert secuencia(datos, "R2", "1") == [(1, "D"), (2, "A")]
+    assert datos["R3"]["paradas"][0]["modos"] == "Tranvía"
+    assert datos["L1"]["paradas"][2]["idZona"] == "Z2"
+
+
+def test_filas_desordenadas_igual_que_agrupadas(capsys):
+    filas = list(STOP_TIMES)
+    random.Random(1).shuffle(filas)
+
+    assert importar_gtfs(crear_zip(filas)) == importar_gtfs(crear_zip(STOP_TIMES))
+    assert "no contiguos" in capsys.readouterr().err
+
+
+def test_ignora_filas_en_blanco():
+    assert importar_gtfs(crear_zip(STOP_TIMES, lineas_en_blanco=True)) == importar_gtfs(crear_zip(STOP_TIMES))
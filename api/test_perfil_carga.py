@@ -0,0 +1,82 @@
+import math
+
+import numpy as np
+
+from perfil_carga import construir_red, calcular_perfiles, frecuencias
+from prediccion import factor_parada
+
+DATOS_CTAN = {
+    "L1": {"paradas": [
+        {"idParada": "C", "sentido": "1", "orden": 3},
+        {"idParada": "A", "sentido": "1", "orden": 1},
+        {"idParada": "B", "sentido": "1", "orden": 2},
+        {"idParada": "C", "sentido": "2", "orden": 1},
+        {"idParada": "A", "sentido": "2", "orden": 2},
+    ]},
+    "L2": {"paradas": [
+        {"idParada": "D", "sentido": "1", "orden": 1},
+        {"idParada": "E", "sentido": "1", "orden": 2},
+        {"idParada": "F", "sentido": "1", "orden": 3},
+        {"idParada": "G", "sentido": "1", "orden": 4},
+    ]},
+    "L3": {"paradas": [
+        {"idParada": "H", "sentido": "1", "orden": 1},
+    ]},
+}
+
+
+def carga_tramo(ids, demanda):
+    """Referencia tramo a tramo, sin vectorizar"""
+    factores = [factor_parada(i) for i in ids]
+    subida = factores[:-1] + [0.0]
+    bajada = [f * i for i, f in enumerate(factores)]
+    escala = sum(subida) / sum(bajada) if sum(bajada) > 0 else 0.0
+    carga, a_bordo = [], 0.0
+    for s, b in zip(subida, bajada):
+        a_bordo += demanda * (s - b * escala)
+        carga.append(max(a_bordo, 0.0))
+    return carga
+
+
+def test_igual_que_bucle_por_tramo():
+    red = construir_red(DATOS_CTAN)
+    demanda = np.arange(24) * 10.0
+    _, _, carga = calcular_perfiles(red, demanda)
+
+    assert red["tramos"] == [("L1", "1"), ("L1", "2"), ("L2", "1"), ("L3", "1")]
+    for inicio, longitud in zip(red["inicios"], red["longitudes"]):
+        ids = red["ids_parada"][inicio:inicio + longitud]
+        for hora in range(24):
+            np.testing.assert_allclose(carga[hora, inicio:inicio + longitud],
+                                       carga_tramo(ids, demanda[hora]), atol=1e-9)
+    assert red["ids_parada"][:3] == ["A", "B", "C"]
+
+
+def test_cada_tramo_termina_vacio():
+    red = construir_red(DATOS_CTAN)
+    _, _, carga = calcular_perfiles(red, np.full(24, 100.0))
+
+    ultimas = red["inicios"] + red["longitudes"] - 1
+    np.testing.assert_allclose(carga[:, ultimas], 0, atol=1e-9)
+
+
+def test_vehiculos_cubren_la_carga_maxima():
+    red = construir_red(DATOS_CTAN)
+    _, _, carga = calcular_perfiles(red, np.arange(24) * 25.0)
+    carga_maxima, vehiculos = frecuencias(red, carga, capacidad=80, frecuencia_minima=2)
+
+    assert carga_maxima.shape == vehiculos.shape == (24, len(red["tramos"]))
+    for hora in range(24):
+        for t, (inicio, longitud) in enumerate(zip(red["inicios"], red["longitudes"])):
+            pico = carga[hora, inicio:inicio + longitud].max()
+            assert carga_maxima[hora, t] == pico
+            assert vehiculos[hora, t] == max(math.ceil(pico / 80), 2)
+
+
+def test_red_sin_paradas():
+    red = construir_red({"L1": {"paradas": []}})
+    _, _, carga = calcular_perfiles(red, np.ones(24))
+
+    assert red["tramos"] == []
+    assert carga.shape == (24, 0)
+    assert frecuencias(red, carga, capacidad=80)[1].shape == (24, 0)